@@ -1,11 +1,14 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import geopandas as gpd
-from shapely.geometry import shape
-import json
+import shapely
+import orjson
 import base64
 import requests
+from requests.adapters import HTTPAdapter
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 
 # --------------------------
 # GitHub Upload Function
@@ -30,6 +33,21 @@ def login():
         st.stop()  # Prevent rest of app from running
 
 
+def github_session(token):
+    """Returns a keep-alive session for the GitHub API, kept per user across reruns."""
+    # Stored in session_state rather than st.cache_resource: requests.Session is
+    # not thread-safe, so it must not be shared between concurrent users
+    if "gh_session" not in st.session_state:
+        session = requests.Session()
+        session.mount("https://api.github.com", HTTPAdapter(pool_connections=4, pool_maxsize=4))
+        session.headers.update({
+            "Authorization": f"token {token}",
+            "Accept": "application/vnd.github+json",
+        })
+        st.session_state.gh_session = session
+    return st.session_state.gh_session
+
+
 def upload_to_github(file_bytes, filename):
     """Uploads GeoJSON file to a GitHub repository using REST API."""
     token = st.secrets["GITHUB_TOKEN"]
@@ -40,63 +58,151 @@ def upload_to_github(file_bytes, filename):
     # Build GitHub API endpoint
     url = f"https://api.github.com/repos/{username}/{repo}/contents/{filename}"
 
-    # Get SHA if file exists (needed for overwrite)
-    headers = {"Authorization": f"token {token}"}
-    get_resp = requests.get(url, headers=headers, params={"ref": branch})
-    sha = get_resp.json().get("sha") if get_resp.status_code == 200 else None
-
-    # Prepare upload payload
-    message = "Update GeoJSON via Streamlit app"
-    content = base64.b64encode(file_bytes).decode("utf-8")
-    data = {"message": message, "content": content, "branch": branch}
+    # Get SHA if file exists (needed for overwrite); GET and PUT share one connection.
+    # The SHA returned by our last upload of this file is reused to skip the GET;
+    # otherwise the payload is base64-encoded while the GET round trip is in flight
+    session = github_session(token)
+    sha_key = f"gh_sha::{filename}"
+    sha = st.session_state.get(sha_key)
     if sha:
-        data["sha"] = sha
+        content = base64.b64encode(file_bytes)
+    else:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            sha_future = executor.submit(fetch_github_sha, session, url, branch)
+            content_future = executor.submit(base64.b64encode, file_bytes)
+            sha = sha_future.result()
+            content = content_future.result()
 
     # Send PUT request to GitHub API
-    resp = requests.put(url, headers=headers, data=json.dumps(data))
+    resp = session.put(url, data=github_payload(content, branch, sha))
+    if resp.status_code in [409, 422] and sha_key in st.session_state:
+        # Cached SHA is stale (file changed elsewhere): look it up and retry once
+        sha = fetch_github_sha(session, url, branch)
+        resp = session.put(url, data=github_payload(content, branch, sha))
 
     if resp.status_code in [200, 201]:
+        st.session_state[sha_key] = resp.json()["content"]["sha"]
         st.success("✅ File uploaded to GitHub successfully!")
         cdn_url = f"https://raw.githubusercontent.com/{username}/{repo}/{branch}/{filename}"
         st.markdown(f"**Public CDN URL:** [📎 {cdn_url}]({cdn_url})")
     else:
+        st.session_state.pop(sha_key, None)
         st.error(f"❌ GitHub upload failed: {resp.status_code} - {resp.text}")
 
 
+def fetch_github_sha(session, url, branch):
+    """Returns the SHA of the file at url on branch, or None if it does not exist yet."""
+    resp = session.get(url, params={"ref": branch})
+    return resp.json().get("sha") if resp.status_code == 200 else None
+
+
+def github_payload(content, branch, sha=None):
+    """Builds the contents-API PUT body around already base64-encoded content."""
+    # base64 output is plain ASCII, so it is spliced into the JSON body as bytes
+    # rather than decoded to str and encoded again
+    data = {"message": "Update GeoJSON via Streamlit app", "branch": branch}
+    if sha:
+        data["sha"] = sha
+    return orjson.dumps(data)[:-1] + b',"content":"' + content + b'"}'
+
+
 # --------------------------
 # Excel → GeoJSON Conversion
 # --------------------------
 
-def convert_to_geojson(uploaded_file):
-    df = pd.read_excel(uploaded_file)
+@st.cache_data(show_spinner=False)
+def convert_to_geojson(file_bytes, filename):
+    """Converts uploaded Excel/GeoParquet bytes to GeoJSON bytes plus the GeoDataFrame behind them."""
+    if filename.lower().endswith(".parquet"):
+        # GeoParquet already stores parsed geometries and is read through Arrow
+        try:
+            gdf = gpd.read_parquet(BytesIO(file_bytes))
+        except ValueError:
+            st.error("Parquet file must be GeoParquet (with 'geo' metadata).")
+            return None, None
+        if gdf.crs is not None:
+            gdf = gdf.to_crs(epsg=4326)
+        return gdf_to_geojson_bytes(gdf), gdf
+
+    df = pd.read_excel(BytesIO(file_bytes), engine="calamine")
     if "geometry" not in df.columns:
         st.error("Excel must contain a 'geometry' column in WKT format.")
-        return None
+        return None, None
 
-    df["geometry"] = gpd.GeoSeries.from_wkt(df["geometry"])
+    # Parse all WKT strings in a single vectorized GEOS call; empty cells become None
+    wkt = df["geometry"].to_numpy(dtype=object)
+    wkt[pd.isna(wkt)] = None
+    df["geometry"] = gpd.GeoSeries(shapely.from_wkt(wkt), index=df.index, crs=None)
     gdf = gpd.GeoDataFrame(df, geometry="geometry")
 
-    geojson_bytes = gdf.to_json().encode("utf-8")
-    return geojson_bytes
+    geojson_bytes = gdf_to_geojson_bytes(gdf)
+    return geojson_bytes, gdf
+
+
+def gdf_to_geojson_bytes(gdf):
+    """Serializes a GeoDataFrame to a GeoJSON FeatureCollection, like gdf.to_json()."""
+    # GEOS writes each geometry straight to a GeoJSON string, so no coordinate
+    # tuples or feature dicts are built; the collection is joined as bytes
+    geometries = shapely.to_geojson(gdf.geometry.values)
+    # to_json() writes empty geometries (e.g. POINT EMPTY) as null, GEOS does not
+    geometries[shapely.is_empty(gdf.geometry.values)] = None
+    properties = gdf.drop(columns=gdf.geometry.name).to_dict(orient="records")
+    features = [
+        b'{"id":' + orjson.dumps(str(idx))
+        + b',"type":"Feature","properties":' + orjson.dumps(
+            props,
+            default=_json_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+        )
+        + b',"geometry":' + (geom.encode("utf-8") if geom is not None else b"null")
+        + b"}"
+        for idx, props, geom in zip(gdf.index, properties, geometries)
+    ]
+    return b'{"type":"FeatureCollection","features":[' + b",".join(features) + b"]}"
+
+
+def _json_default(value):
+    """Fallback for property values orjson cannot serialize natively (NaT, numpy/pandas scalars, arrays)."""
+    # Arrow list/struct columns arrive as (object-dtype) numpy arrays; pd.isna
+    # would return an array for these, so turn them into lists first
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if pd.isna(value):
+        return None
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
 
 
 def prettify_numbers(df):
     """Convert float values like 8.0 → 8 for all columns in a DataFrame."""
-    for col in df.select_dtypes(include=["float", "int"]).columns:
-        df[col] = df[col].apply(lambda x: int(x) if pd.notnull(x) and x == int(x) else x)
+    for col in df.select_dtypes(include=["float"]).columns:
+        values = df[col].to_numpy()
+        present = ~np.isnan(values)
+        # Cast whole-number columns to nullable Int64 instead of mixing ints and
+        # floats in an object column; columns with fractions, no values or values
+        # outside the int64 range (including inf) stay float
+        if (
+            present.any()
+            and (np.abs(values[present]) < 2**63).all()
+            and (np.mod(values[present], 1) == 0).all()
+        ):
+            df[col] = df[col].astype("Int64")
     return df
 
 # --------------------------
 # Streamlit UI
 # --------------------------
 
-def geojson_to_dataframe(geojson_bytes):
-    """Converts a GeoJSON byte string into a pandas DataFrame."""
-    geojson = json.loads(geojson_bytes.decode("utf-8"))
-    gdf = gpd.GeoDataFrame.from_features(geojson["features"])
-    df = pd.DataFrame(gdf.drop(columns="geometry"))
-    df["longitude"] = gdf.geometry.x
-    df["latitude"] = gdf.geometry.y
+def gdf_to_dataframe(gdf):
+    """Converts a GeoDataFrame into a pandas DataFrame with longitude/latitude columns."""
+    df = pd.DataFrame(gdf.drop(columns=gdf.geometry.name))
+    # get_x/get_y yield NaN for missing or non-point geometries, but raise on
+    # empty points, so empties are nulled first (as gdf_to_geojson_bytes does)
+    geoms = gdf.geometry.values.copy()
+    geoms[shapely.is_empty(geoms)] = None
+    df["longitude"] = shapely.get_x(geoms)
+    df["latitude"] = shapely.get_y(geoms)
     return df
 
 st.set_page_config(
@@ -110,21 +216,21 @@ st.title("🗺️ Excel → GeoJSON Converter")
 st.write("Welcome to your conversion dashboard!")
 login()
 
-uploaded_file = st.file_uploader("Upload Excel File", type=["xlsx"])
+uploaded_file = st.file_uploader("Upload Excel or GeoParquet File", type=["xlsx", "parquet"])
 if uploaded_file:
-    geojson_bytes = convert_to_geojson(uploaded_file)
+    geojson_bytes, gdf = convert_to_geojson(uploaded_file.getvalue(), uploaded_file.name)
     if geojson_bytes:
         st.success("✅ Successfully converted to GeoJSON!")
         
         # Show table preview
         st.subheader("📋 GeoJSON Data Table")
-        df = geojson_to_dataframe(geojson_bytes)
+        df = gdf_to_dataframe(gdf)
         df = prettify_numbers(df)
         st.dataframe(df, use_container_width=True)
         
         # Optional: Map preview
         if st.checkbox("Show map preview"):
-            st.map(df[["latitude", "longitude"]])
+            st.map(df[["latitude", "longitude"]].dropna())
     
         # Upload to GitHub (as before)
         filename = st.text_input("GitHub Filename", "converted.geojson")